@@ -1,19 +1,69 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 
-from reviewer import CodeReviewService, MissingAPIKeyError, get_reviewer
+from reviewer import (
+    BatchPendingError,
+    CodeReviewService,
+    MissingAPIKeyError,
+    ReviewMetadata,
+    ReviewerBusyError,
+    ReviewResult,
+    get_reviewer,
+)
+
+
+CONCURRENT_MODE = "Concurrent"
+BATCH_MODE = "Message Batches"
+PENDING_BATCH_KEY = "pending_batch"
+TRUNCATED_WARNING = "The review reached the output token limit and was cut off."
+# Files beyond this are rejected before reading; they would not fit the model context anyway.
+MAX_UPLOAD_BYTES = 5_000_000
 
 
 @st.cache_resource(show_spinner=False)
 def load_reviewer() -> CodeReviewService:
-    return get_reviewer()
+    reviewer = get_reviewer()
+    # cache_resource runs this once per process, so the warm-up is never repeated on reruns.
+    threading.Thread(target=reviewer.warm_up, daemon=True).start()
+    return reviewer
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _decode(file_id: str, _uploaded_file) -> str:
+    # The leading underscore keeps Streamlit from hashing the upload; file_id alone
+    # keys the cache, so the bytes are only copied out on a miss.
+    return _uploaded_file.getvalue().decode("utf-8", errors="replace")
 
 
 def read_uploaded_file(uploaded_file) -> str:
-    data = uploaded_file.read()
-    try:
-        return data.decode("utf-8")
-    except UnicodeDecodeError:
-        return data.decode("latin-1", errors="ignore")
+    """Decode an upload once per file; reruns reuse the cached text."""
+    return _decode(uploaded_file.file_id, uploaded_file)
+
+
+def stream_review(placeholder, stream) -> ReviewMetadata:
+    """Render streamed review text into ``placeholder`` and return the final metadata."""
+    chunks = []
+    placeholder.caption("Waiting for a free review slot...")
+    while True:
+        try:
+            chunk = next(stream)
+        except StopIteration as done:
+            return done.value
+        chunks.append(chunk)
+        placeholder.markdown("".join(chunks))
+
+
+def upload_too_large(uploaded_file) -> bool:
+    if uploaded_file.size <= MAX_UPLOAD_BYTES:
+        return False
+    st.error(
+        f"{uploaded_file.name} is {uploaded_file.size / 1_000_000:.1f} MB; "
+        f"the limit is {MAX_UPLOAD_BYTES / 1_000_000:.0f} MB."
+    )
+    return True
 
 
 def main():
@@ -24,17 +74,18 @@ def main():
         "An AI will scan your code and generate a review for code accuracy, quality, vulnerabilities, and best practices."
     )
 
+    # Build the reviewer before the first click; a missing key is reported when Review is pressed.
+    try:
+        load_reviewer()
+    except MissingAPIKeyError:
+        pass
+
 
     uploaded_file = st.file_uploader("Upload a code file", type=None)
     pasted_code = st.text_area("Or paste code directly", height=320, placeholder="def hello_world():\n    print('Hello!')\n")
 
-    source_code = ""
-    filename = None
-    if uploaded_file is not None:
-        filename = uploaded_file.name
-        source_code = read_uploaded_file(uploaded_file)
-    elif pasted_code.strip():
-        source_code = pasted_code
+    if uploaded_file is not None and upload_too_large(uploaded_file):
+        return
 
     col1, col2 = st.columns([1, 3])
     with col1:
@@ -43,6 +94,14 @@ def main():
         st.caption("This usually takes a couple seconds.")
 
     if submit_clicked:
+        source_code = ""
+        filename = None
+        if uploaded_file is not None:
+            filename = uploaded_file.name
+            source_code = read_uploaded_file(uploaded_file)
+        elif pasted_code.strip():
+            source_code = pasted_code
+
         if not source_code.strip():
             st.warning("Please upload a file or paste a code text.")
             return
@@ -53,18 +112,111 @@ def main():
             st.error(str(exc))
             return
 
-        with st.spinner("Generating Review..."):
-            try:
-                review_markdown, metadata = reviewer.review(
-                    source_code,
-                    filename=filename,
-                )
-            except Exception as exc:  # noqa: BLE001 - show any failure to the user
-                st.error(f"Review failed: {exc}")
-                return
+        try:
+            metadata = stream_review(st.empty(), reviewer.review_stream(source_code, filename=filename))
+        except (ValueError, ReviewerBusyError) as exc:  # rejected before reaching the API
+            st.warning(str(exc))
+            return
+        except Exception as exc:  # noqa: BLE001 - show any failure to the user
+            st.error(f"Review failed: {exc}")
+            return
 
         st.success("Review complete")
+        if metadata.truncated:
+            st.warning(TRUNCATED_WARNING)
+
+    with st.expander("Batch review multiple files"):
+        batch_files = st.file_uploader("Upload code files", type=None, accept_multiple_files=True)
+        batch_mode = st.radio(
+            "Review mode",
+            [CONCURRENT_MODE, BATCH_MODE],
+            help=(
+                "Concurrent reviews run in real time. "
+                "Batch reviews run through Anthropic's Message Batches API at a lower cost, "
+                "but results can take several minutes to arrive."
+            ),
+        )
+        batch_clicked = st.button("Review files")
+
+        pending = st.session_state.get(PENDING_BATCH_KEY)
+        check_clicked = False
+        if pending is not None:
+            st.caption(f"Pending batch: {pending[0]}")
+            check_clicked = st.button("Check batch status")
+
+    if batch_clicked:
+        render_batch_review(batch_files, batch_mode)
+    elif check_clicked:
+        render_pending_batch(pending)
+
+
+def render_batch_review(batch_files, mode: str) -> None:
+    if any(upload_too_large(uploaded) for uploaded in batch_files or []):
+        return
+    items = [(uploaded.name, read_uploaded_file(uploaded)) for uploaded in batch_files or []]
+    items = [(name, code) for name, code in items if code.strip()]
+    if not items:
+        st.warning("Please upload at least one non-empty file.")
+        return
+
+    try:
+        reviewer = load_reviewer()
+    except MissingAPIKeyError as exc:
+        st.error(str(exc))
+        return
+
+    with st.spinner(f"Reviewing {len(items)} files..."):
+        try:
+            if mode == BATCH_MODE:
+                st.session_state.pop(PENDING_BATCH_KEY, None)
+                # Submit without waiting; results are fetched with Check batch status.
+                results = reviewer.review_batch(items, max_wait=0)
+            else:
+                # Run the event loop off the script thread so it never collides with another loop.
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    results = executor.submit(asyncio.run, reviewer.review_many(items)).result()
+        except BatchPendingError as exc:
+            remember_pending_batch(exc)
+            return
+        except Exception as exc:  # noqa: BLE001 - show any failure to the user
+            st.error(f"Batch review failed: {exc}")
+            return
+
+    show_results(results)
+
+
+def render_pending_batch(pending) -> None:
+    batch_id, placeholders = pending
+    try:
+        reviewer = load_reviewer()
+        results = reviewer.collect_batch(batch_id, placeholders, max_wait=0)
+    except BatchPendingError as exc:
+        remember_pending_batch(exc)
+        return
+    except Exception as exc:  # noqa: BLE001 - show any failure to the user
+        st.error(f"Batch review failed: {exc}")
+        return
+
+    st.session_state.pop(PENDING_BATCH_KEY, None)
+    show_results(results)
+
+
+def remember_pending_batch(exc: BatchPendingError) -> None:
+    # Keep only the id and placeholders; the exception's traceback would pin the uploaded code.
+    st.session_state[PENDING_BATCH_KEY] = (exc.batch_id, exc.results)
+    st.info(
+        f"Batch {exc.batch_id} is still processing. "
+        "Use Check batch status later in this browser session to load the results."
+    )
+
+
+def show_results(results: list[ReviewResult]) -> None:
+    st.success("Review complete")
+    for name, review_markdown, metadata in results:
+        st.subheader(name)
         st.markdown(review_markdown)
+        if metadata is not None and metadata.truncated:
+            st.warning(TRUNCATED_WARNING)
 
 
 
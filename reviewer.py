@@ -7,25 +7,228 @@ easy to unit test the code review prompt/logic later if needed.
 
 from __future__ import annotations
 
+import asyncio
+import atexit
+import contextlib
+import functools
+import hashlib
+import json
+import logging
 import os
-from dataclasses import dataclass
-from typing import Dict, Optional, Tuple
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Dict, Generator, Iterator, List, Optional, Sequence, Tuple
 
-from anthropic import Anthropic, APIError
-from dotenv import load_dotenv
-from rich.console import Console
-from rich.panel import Panel
+import diskcache
+import httpx
+from anthropic import Anthropic, APIError, AsyncAnthropic
 
-console = Console()
+logger = logging.getLogger(__name__)
 
-# Load environment variables once when the module is imported.
-load_dotenv()
+# Fall back to a local .env file only when the key is not already exported;
+# python-dotenv is a development dependency.
+if os.getenv("ANTHROPIC_API_KEY") is None:
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        logger.debug("python-dotenv is not installed (see requirements-dev.txt); skipping .env")
+    else:
+        load_dotenv()
+
+if os.getenv("REVIEWER_DEBUG"):
+    # Pretty console output for local debugging only; rich is a dev dependency.
+    from rich.logging import RichHandler
+
+    logger.addHandler(RichHandler())
+    logger.setLevel(logging.DEBUG)
+
+
+# Bounded network behaviour so a stuck request cannot hang the Streamlit worker.
+DEFAULT_TIMEOUT_SECONDS = 60.0
+DEFAULT_CONNECT_TIMEOUT_SECONDS = 5.0
+# The SDK retries connection errors, 408/409/429 and 5xx responses, including
+# when opening a stream, following retry-after and x-should-retry with jitter.
+DEFAULT_MAX_RETRIES = 3
+# Inputs larger than this get a read timeout of at least LARGE_INPUT_TIMEOUT_SECONDS.
+LARGE_INPUT_CHARS = 100_000
+LARGE_INPUT_TIMEOUT_SECONDS = 180.0
+# Message Batches are processed asynchronously at a discount; poll until done.
+BATCH_POLL_INTERVAL_SECONDS = 10.0
+# Batches can take up to 24h, so callers wait a bounded time and check back later.
+BATCH_MAX_WAIT_SECONDS = 60.0
+# Limit on in-flight reviews per process, shared by every Streamlit session and
+# by both the sync and async paths, to stay under the account rate limit
+# instead of tripping 429 retries.
+MAX_CONCURRENCY = int(os.getenv("REVIEWER_MAX_CONCURRENCY", "8"))
+if MAX_CONCURRENCY < 1:
+    raise ValueError(f"REVIEWER_MAX_CONCURRENCY must be at least 1, got {MAX_CONCURRENCY}.")
+# Reviews are deterministic at temperature 0, so identical requests are served
+# from a per-user disk cache (REVIEW_CACHE_DIR overrides the location).
+CACHE_DIR_NAME = "code-reviewer-ai"
+HASH_SLICE_CHARS = 1 << 16
+# Rough input budget, estimated at ~4 characters per token, that leaves room in
+# the context window for the prompt and the response.
+MAX_INPUT_TOKENS = 150_000
+CHARS_PER_TOKEN = 4
+# Output allowance scales with file length between these bounds; output tokens
+# are decoded serially, so the cap bounds worst-case response time. The floor
+# leaves room for the five-section review format even on small files, and is
+# lowered to ANTHROPIC_MAX_TOKENS when that override is smaller.
+MIN_OUTPUT_TOKENS = 1200
+DEFAULT_MAX_OUTPUT_TOKENS = 2000
+# Inputs with fewer meaningful characters than this, comments removed and
+# whitespace runs collapsed to one space, are not worth a review.
+MIN_CODE_CHARS = 20
+_WHITESPACE = re.compile(r"\s+")
+_HASH_COMMENT = re.compile(r"#.*")
+# Only strip "#" comments where "#" actually starts one; in C or CSS it is code.
+_HASH_COMMENT_LANGUAGES = {"python", "ruby", "bash", "yaml"}
+# Without a known language (e.g. pasted code), only strip whole lines that read
+# like comments ("# note"), which leaves "#include" and "#header" alone.
+_HASH_COMMENT_LINE = re.compile(r"^[ \t]*#(?:[ \t].*)?$", re.MULTILINE)
+
+
+REVIEW_INSTRUCTIONS = (
+    "You are reviewing a single code file uploaded by a developer. "
+    "Return your feedback in Markdown with:\n"
+    "1. A concise summary of the code's intent and overall quality.\n"
+    "2. A prioritized list of actionable findings grouped by severity.\n"
+    "3. Specific code references (line numbers if available) and concrete suggestions.\n"
+    "4. Optional improvement ideas if time allows.\n\n"
+    "Only mention what you directly observe and avoid repeating requirements.\n\n"
+)
+
+
+# Fence label used when the caller gives no language hint.
+_EXT_TO_LANG = {
+    ".py": "python",
+    ".js": "javascript",
+    ".jsx": "jsx",
+    ".ts": "typescript",
+    ".tsx": "tsx",
+    ".rs": "rust",
+    ".go": "go",
+    ".java": "java",
+    ".kt": "kotlin",
+    ".swift": "swift",
+    ".c": "c",
+    ".h": "c",
+    ".cpp": "cpp",
+    ".cc": "cpp",
+    ".hpp": "cpp",
+    ".cs": "csharp",
+    ".rb": "ruby",
+    ".php": "php",
+    ".scala": "scala",
+    ".sh": "bash",
+    ".sql": "sql",
+    ".html": "html",
+    ".css": "css",
+    ".yaml": "yaml",
+    ".yml": "yaml",
+    ".json": "json",
+}
+
+
+def _language_for(filename: Optional[str]) -> str:
+    return _EXT_TO_LANG.get(os.path.splitext(filename or "")[1].lower(), "")
+
+
+def _default_cache_dir() -> str:
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, CACHE_DIR_NAME)
+
+
+def _private_dir(directory: str) -> str:
+    """Create ``directory`` for the current user only and refuse one owned by someone else.
+
+    The cache holds submitted source code, so other local users must not be
+    able to read it or plant entries in it.
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        raise PermissionError(f"{directory} is owned by another user")
+    if info.st_mode & 0o077:
+        os.chmod(directory, 0o700)
+    return directory
+
+
+@functools.lru_cache(maxsize=1)
+def _shared_http_client() -> httpx.Client:
+    """Process-wide HTTP client so every service instance reuses warm connections."""
+    client = httpx.Client(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=16, keepalive_expiry=30),
+    )
+    atexit.register(client.close)
+    return client
+
+
+_SYNC_INFLIGHT = threading.BoundedSemaphore(MAX_CONCURRENCY)
+# How long a synchronous review waits for a free slot before giving up.
+SLOT_WAIT_SECONDS = 30.0
+_inflight_lock = threading.Lock()
+_inflight = 0
+
+
+@contextlib.contextmanager
+def _track_inflight() -> Iterator[None]:
+    """Count a review as in flight and log the current depth."""
+    global _inflight
+    with _inflight_lock:
+        _inflight += 1
+        depth = _inflight
+    logger.info("In-flight reviews: %d/%d", depth, MAX_CONCURRENCY)
+    try:
+        yield
+    finally:
+        with _inflight_lock:
+            _inflight -= 1
+
+
+@contextlib.contextmanager
+def _sync_inflight_slot() -> Iterator[None]:
+    """Take a slot of the process-wide limit, giving up after ``SLOT_WAIT_SECONDS``."""
+    if not _SYNC_INFLIGHT.acquire(timeout=SLOT_WAIT_SECONDS):
+        raise ReviewerBusyError(f"All {MAX_CONCURRENCY} review slots are busy. Please try again shortly.")
+    try:
+        with _track_inflight():
+            yield
+    finally:
+        _SYNC_INFLIGHT.release()
+
+
+@contextlib.asynccontextmanager
+async def _async_inflight_slot() -> AsyncIterator[None]:
+    """Take a slot of the process-wide limit from async code without blocking the event loop."""
+    acquire = asyncio.ensure_future(asyncio.to_thread(_SYNC_INFLIGHT.acquire))
+    try:
+        await asyncio.shield(acquire)
+    except asyncio.CancelledError:
+        # The worker thread still gets the slot eventually; hand it straight back.
+        acquire.add_done_callback(lambda _: _SYNC_INFLIGHT.release())
+        raise
+    try:
+        yield
+    finally:
+        _SYNC_INFLIGHT.release()
 
 
 class MissingAPIKeyError(RuntimeError):
     """Raised when we cannot find an Anthropic API key in the environment."""
 
 
+class InputTooLargeError(ValueError):
+    """Raised when the code is too large to review in a single request."""
+
+
+class ReviewerBusyError(RuntimeError):
+    """Raised when every review slot stays busy for longer than ``SLOT_WAIT_SECONDS``."""
+
+
 @dataclass
 class ReviewMetadata:
     """Simple structure returned alongside Claude's response."""
@@ -33,6 +236,24 @@ class ReviewMetadata:
     input_tokens: int
     output_tokens: int
     model: str
+    cache_creation_input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    # True when Claude stopped at max_tokens, so the review text is cut off.
+    truncated: bool = False
+
+
+class BatchPendingError(RuntimeError):
+    """Raised when a Message Batch is still processing after the allowed wait."""
+
+    def __init__(self, batch_id: str, results: List[ReviewResult]):
+        super().__init__(f"Batch {batch_id} is still processing.")
+        self.batch_id = batch_id
+        self.results = results
+
+
+# (filename, review markdown, metadata) for one file of a multi-file review;
+# metadata is None when that file's review did not succeed.
+ReviewResult = Tuple[str, str, Optional[ReviewMetadata]]
 
 
 class CodeReviewService:
@@ -42,77 +263,399 @@ class CodeReviewService:
         resolved_key = api_key or os.getenv("ANTHROPIC_API_KEY")
         if not resolved_key:
             raise MissingAPIKeyError(
-                "ANTHROPIC_API_KEY is not set. Create a .env file or export it before running the reviewer."
+                "ANTHROPIC_API_KEY is not set. Export it before running the reviewer, "
+                "or put it in a .env file (loading .env needs python-dotenv from requirements-dev.txt)."
             )
 
-        self.client = Anthropic(api_key=resolved_key)
+        self.timeout = float(os.getenv("ANTHROPIC_TIMEOUT", DEFAULT_TIMEOUT_SECONDS))
+        max_retries = int(os.getenv("ANTHROPIC_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+        self._client_options = {
+            "api_key": resolved_key,
+            "timeout": httpx.Timeout(self.timeout, connect=DEFAULT_CONNECT_TIMEOUT_SECONDS),
+            "max_retries": max_retries,
+        }
+        self.client = Anthropic(**self._client_options, http_client=_shared_http_client())
         default_model = "claude-sonnet-4-5-20250929"
         self.model = model or os.getenv("ANTHROPIC_MODEL", default_model)
+        self.max_output_tokens = int(os.getenv("ANTHROPIC_MAX_TOKENS", DEFAULT_MAX_OUTPUT_TOKENS))
 
     def review(
         self, code: str, filename: Optional[str] = None, language: Optional[str] = None, notes: Optional[str] = None
     ) -> Tuple[str, ReviewMetadata]:
         """Send the code to Claude and return the markdown review text and metadata."""
-        if not code.strip():
-            raise ValueError("No code provided for review.")
+        self._check_reviewable(code, filename)
 
-        prompt = self._build_prompt(code=code, filename=filename, language=language, notes=notes)
-        console.print(Panel.fit("Dispatching code review to Claude 3.5 Sonnet", title="Claude Review"))
+        request = self._request_kwargs(code=code, filename=filename, language=language, notes=notes)
+        key = self._cache_key(request)
+        cached = self._cached_review(key)
+        if cached is not None:
+            return cached
+
+        logger.info("Dispatching code review to %s", self.model)
 
         try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=2000,
-                temperature=0,
-                system=self._system_instructions(),
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-            )
+            with _sync_inflight_slot():
+                response = self._client_for(code).messages.create(**request)
+        except APIError as exc:
+            logger.error("Anthropic API error: %s", exc)
+            raise
+
+        content = response.content[0].text if response.content else "Claude returned an empty response."
+        metadata = self._metadata_from(response)
+        self._log_complete(metadata)
+        self._store_review(key, content, metadata)
+
+        return content, metadata
+
+    def review_stream(
+        self, code: str, filename: Optional[str] = None, language: Optional[str] = None, notes: Optional[str] = None
+    ) -> Generator[str, None, ReviewMetadata]:
+        """Stream the markdown review text from Claude as it is generated.
+
+        Yields text chunks as they arrive. The generator's return value is the
+        ``ReviewMetadata`` for the finished message.
+        """
+        self._check_reviewable(code, filename)
+
+        request = self._request_kwargs(code=code, filename=filename, language=language, notes=notes)
+        key = self._cache_key(request)
+        cached = self._cached_review(key)
+        if cached is not None:
+            content, metadata = cached
+            yield content
+            return metadata
+
+        logger.info("Streaming code review from %s", self.model)
+
+        try:
+            with _sync_inflight_slot():
+                with self._client_for(code).messages.stream(**request) as stream:
+                    for text in stream.text_stream:
+                        yield text
+                    response = stream.get_final_message()
+        except APIError as exc:
+            logger.error("Anthropic API error: %s", exc)
+            raise
+
+        content = response.content[0].text if response.content else "Claude returned an empty response."
+        metadata = self._metadata_from(response)
+        self._log_complete(metadata)
+        self._store_review(key, content, metadata)
+        return metadata
+
+    def warm_up(self) -> None:
+        """Open a pooled connection with a free token-count call so the first review skips the handshake."""
+        try:
+            self.client.messages.count_tokens(model=self.model, messages=[{"role": "user", "content": "hi"}])
+        except APIError as exc:
+            logger.warning("Reviewer warm-up failed: %s", exc)
+
+    def review_batch(
+        self,
+        items: Sequence[Tuple[str, str]],
+        poll_interval: float = BATCH_POLL_INTERVAL_SECONDS,
+        max_wait: float = BATCH_MAX_WAIT_SECONDS,
+    ) -> List[ReviewResult]:
+        """Review many ``(filename, code)`` pairs through the Message Batches API.
+
+        Intended for bulk or offline work where latency does not matter. Waits
+        up to ``max_wait`` seconds and returns one result per item in input
+        order; entries that did not succeed carry an error message and no
+        metadata. Raises ``BatchPendingError`` if the batch is still running,
+        so the caller can pass it to ``collect_batch`` later.
+        """
+        results, reviewable = self._precheck(items)
+        if not reviewable:
+            return results
+
+        # custom_id only allows a restricted character set, so key by position.
+        batch_requests = [
+            {
+                "custom_id": f"review-{index}",
+                "params": self._request_kwargs(code=items[index][1], filename=items[index][0], language=None, notes=None),
+            }
+            for index in reviewable
+        ]
+
+        try:
+            batch = self.client.messages.batches.create(requests=batch_requests)
+        except APIError as exc:
+            logger.error("Anthropic API error: %s", exc)
+            raise
+        logger.info("Submitted batch %s with %d code reviews", batch.id, len(batch_requests))
+
+        return self.collect_batch(batch.id, results, poll_interval=poll_interval, max_wait=max_wait)
+
+    def collect_batch(
+        self,
+        batch_id: str,
+        results: Sequence[ReviewResult],
+        poll_interval: float = BATCH_POLL_INTERVAL_SECONDS,
+        max_wait: float = BATCH_MAX_WAIT_SECONDS,
+    ) -> List[ReviewResult]:
+        """Wait up to ``max_wait`` seconds for a submitted batch and fill in its results.
+
+        ``results`` holds one entry per item in submission order, as returned
+        by ``review_batch`` or carried on ``BatchPendingError``.
+        """
+        results = list(results)
+        deadline = time.monotonic() + max_wait
+        try:
+            batch = self.client.messages.batches.retrieve(batch_id)
+            while batch.processing_status != "ended":
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.info("Batch %s is still processing", batch_id)
+                    raise BatchPendingError(batch_id, results)
+                time.sleep(min(poll_interval, remaining))
+                batch = self.client.messages.batches.retrieve(batch_id)
+
+            for entry in self.client.messages.batches.results(batch_id):
+                index = int(entry.custom_id.rsplit("-", 1)[1])
+                filename = results[index][0]
+                if entry.result.type != "succeeded":
+                    results[index] = (filename, f"Review {entry.result.type}.", None)
+                    continue
+                message = entry.result.message
+                content = message.content[0].text if message.content else "Claude returned an empty response."
+                metadata = self._metadata_from(message)
+                self._log_complete(metadata)
+                results[index] = (filename, content, metadata)
         except APIError as exc:
-            console.print(Panel.fit(f"Anthropic API error: {exc}", title="API Error", style="red"))
+            logger.error("Anthropic API error: %s", exc)
             raise
 
+        return results
+
+    async def review_many(
+        self, items: Sequence[Tuple[str, str]], max_concurrency: int = MAX_CONCURRENCY
+    ) -> List[ReviewResult]:
+        """Review many ``(filename, code)`` pairs concurrently in real time.
+
+        Returns one result per item in input order, in the same shape as
+        ``review_batch``; entries that failed carry an error message and no metadata.
+        """
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}.")
+        results, reviewable = self._precheck(items)
+        if not reviewable:
+            return results
+
+        logger.info("Dispatching %d concurrent code reviews", len(reviewable))
+        sem = asyncio.Semaphore(max_concurrency)
+        # The async connection pool is bound to the running event loop, so it
+        # lives only as long as this call.
+        async with AsyncAnthropic(**self._client_options) as aclient:
+            outcomes = await asyncio.gather(
+                *(self._review_one(aclient, sem, items[index][1], filename=items[index][0]) for index in reviewable),
+                return_exceptions=True,
+            )
+
+        for index, outcome in zip(reviewable, outcomes):
+            filename = items[index][0]
+            if isinstance(outcome, BaseException):
+                logger.error("Review of %s failed: %s", filename, outcome)
+                results[index] = (filename, f"Review failed: {outcome}", None)
+            else:
+                results[index] = (filename, *outcome)
+        return results
+
+    def _precheck(self, items: Sequence[Tuple[str, str]]) -> Tuple[List[ReviewResult], List[int]]:
+        """Check every file up front; a rejected file gets its own result instead of failing the run.
+
+        Returns a placeholder result per item and the indices that should be sent to the API.
+        """
+        results: List[ReviewResult] = []
+        reviewable: List[int] = []
+        for index, (filename, code) in enumerate(items):
+            try:
+                self._check_reviewable(code, filename)
+            except ValueError as exc:
+                results.append((filename, f"Review skipped: {exc}", None))
+                continue
+            results.append((filename, "No result returned for this file.", None))
+            reviewable.append(index)
+        return results, reviewable
+
+    async def _review_one(
+        self, aclient: AsyncAnthropic, sem: asyncio.Semaphore, code: str, filename: Optional[str] = None
+    ) -> Tuple[str, ReviewMetadata]:
+        request = self._request_kwargs(code=code, filename=filename, language=None, notes=None)
+        async with sem, _async_inflight_slot():
+            with _track_inflight():
+                response = await aclient.messages.create(**request)
+
         content = response.content[0].text if response.content else "Claude returned an empty response."
-        metadata = ReviewMetadata(
+        metadata = self._metadata_from(response)
+        self._log_complete(metadata)
+        return content, metadata
+
+    @staticmethod
+    def _check_reviewable(code: str, filename: Optional[str] = None) -> None:
+        """Reject inputs that should never reach the API."""
+        where = f" in {filename}" if filename else ""
+        stripped = code.strip()
+        if not stripped:
+            raise ValueError(f"No code provided for review{where}.")
+        language = _language_for(filename)
+        if language in _HASH_COMMENT_LANGUAGES:
+            meaningful = _HASH_COMMENT.sub("", stripped)
+        elif not language:
+            meaningful = _HASH_COMMENT_LINE.sub("", stripped)
+        else:
+            meaningful = stripped
+        if len(_WHITESPACE.sub(" ", meaningful).strip()) < MIN_CODE_CHARS:
+            raise ValueError(f"Not enough code to review{where}.")
+
+        estimated_tokens = len(code) // CHARS_PER_TOKEN
+        logger.info("Estimated input tokens%s: %d", where, estimated_tokens)
+        if estimated_tokens > MAX_INPUT_TOKENS:
+            raise InputTooLargeError(
+                f"The code{where} is roughly {estimated_tokens:,} tokens, above the {MAX_INPUT_TOKENS:,} token limit. "
+                "Split it into smaller files and review them separately."
+            )
+
+    def _client_for(self, code: str) -> Anthropic:
+        """Return the client to use, extending the read timeout for large inputs."""
+        if len(code) < LARGE_INPUT_CHARS:
+            return self.client
+        # Never shorter than the configured timeout, which may already be generous.
+        timeout = max(self.timeout, LARGE_INPUT_TIMEOUT_SECONDS)
+        return self.client.with_options(timeout=httpx.Timeout(timeout, connect=DEFAULT_CONNECT_TIMEOUT_SECONDS))
+
+    def _request_kwargs(
+        self, *, code: str, filename: Optional[str], language: Optional[str], notes: Optional[str]
+    ) -> Dict[str, object]:
+        """Keyword arguments shared by every Messages API call for a review."""
+        prompt = self._build_prompt(code=code, filename=filename, language=language, notes=notes)
+        return {
+            "model": self.model,
+            "max_tokens": self._max_tokens_for(code),
+            "temperature": 0,
+            "system": [
+                {
+                    "type": "text",
+                    "text": self._system_instructions(),
+                    "cache_control": {"type": "ephemeral"},
+                }
+            ],
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt,
+                }
+            ],
+        }
+
+    def _max_tokens_for(self, code: str) -> int:
+        """Scale the output allowance with the number of lines under review."""
+        loc = code.count("\n") + 1
+        floor = min(MIN_OUTPUT_TOKENS, self.max_output_tokens)
+        return max(floor, min(self.max_output_tokens, 200 + 6 * loc))
+
+    @staticmethod
+    def _cache_key(request: Dict[str, object]) -> str:
+        """Content hash of everything that influences the review output.
+
+        The message text is fed to the hash in slices so large inputs are not
+        serialised into another full-size copy.
+        """
+        digest = hashlib.blake2b()
+        settings = {name: value for name, value in request.items() if name != "messages"}
+        digest.update(json.dumps(settings, sort_keys=True, default=str).encode("utf-8"))
+        for message in request["messages"]:
+            for block in message["content"]:
+                text = block["text"]
+                # Length prefixes keep block boundaries unambiguous.
+                digest.update(f"\0{message['role']}\0{len(text)}\0".encode("utf-8"))
+                for start in range(0, len(text), HASH_SLICE_CHARS):
+                    digest.update(text[start : start + HASH_SLICE_CHARS].encode("utf-8"))
+        return digest.hexdigest()
+
+    @functools.cached_property
+    def cache(self) -> Optional[diskcache.Cache]:
+        """Review cache, opened on first use; ``None`` when the directory is unusable.
+
+        Entries are stored as JSON rather than pickles, so reading the cache
+        never executes anything.
+        """
+        directory = os.getenv("REVIEW_CACHE_DIR") or _default_cache_dir()
+        try:
+            return diskcache.Cache(_private_dir(directory), disk=diskcache.JSONDisk)
+        except OSError as exc:
+            logger.warning("Review cache disabled, cannot open %s: %s", directory, exc)
+            return None
+
+    def _cached_review(self, key: str) -> Optional[Tuple[str, ReviewMetadata]]:
+        if self.cache is None:
+            return None
+        cached = self.cache.get(key)
+        if cached is None:
+            return None
+        content, metadata = cached
+        logger.info("Serving code review from local cache")
+        return content, ReviewMetadata(**metadata)
+
+    def _store_review(self, key: str, content: str, metadata: ReviewMetadata) -> None:
+        if metadata.truncated:
+            # A cut-off review would otherwise be served from the cache forever.
+            logger.warning("Review hit max_tokens (%d output tokens); not caching it", metadata.output_tokens)
+            return
+        if self.cache is not None:
+            self.cache.set(key, [content, asdict(metadata)])
+
+    @staticmethod
+    def _metadata_from(response) -> ReviewMetadata:
+        return ReviewMetadata(
             input_tokens=response.usage.input_tokens,
             output_tokens=response.usage.output_tokens,
             model=response.model,
+            cache_creation_input_tokens=getattr(response.usage, "cache_creation_input_tokens", None) or 0,
+            cache_read_input_tokens=getattr(response.usage, "cache_read_input_tokens", None) or 0,
+            truncated=response.stop_reason == "max_tokens",
         )
 
-        console.print(
-            Panel.fit(
-                f"Model: {metadata.model}\nInput tokens: {metadata.input_tokens}\nOutput tokens: {metadata.output_tokens}",
-                title="Review complete",
-                style="green",
-            )
+    @staticmethod
+    def _log_complete(metadata: ReviewMetadata) -> None:
+        logger.info(
+            "Review complete. Model: %s, input tokens: %d, output tokens: %d, cache read tokens: %d, cache write tokens: %d",
+            metadata.model,
+            metadata.input_tokens,
+            metadata.output_tokens,
+            metadata.cache_read_input_tokens,
+            metadata.cache_creation_input_tokens,
         )
 
-        return content, metadata
-
     def _build_prompt(
         self, *, code: str, filename: Optional[str], language: Optional[str], notes: Optional[str]
-    ) -> str:
-        """Craft the user-facing prompt for Claude."""
+    ) -> List[Dict[str, object]]:
+        """Craft the user-facing prompt for Claude as message content blocks.
+
+        The instruction header is identical for every review, so it is sent as
+        its own block marked for prompt caching. The fenced code gets its own
+        block rather than being concatenated onto the file details.
+        """
+        language = language or _language_for(filename)
         filename_line = f"Filename: {filename}\n" if filename else ""
         language_line = f"Language: {language}\n" if language else ""
         notes_line = f"Submitter notes: {notes.strip()}\n" if notes else ""
+        code_stripped = code.strip()
 
-        return (
-            "You are reviewing a single code file uploaded by a developer. "
-            "Return your feedback in Markdown with:\n"
-            "1. A concise summary of the code's intent and overall quality.\n"
-            "2. A prioritized list of actionable findings grouped by severity.\n"
-            "3. Specific code references (line numbers if available) and concrete suggestions.\n"
-            "4. Optional improvement ideas if time allows.\n\n"
-            "Only mention what you directly observe and avoid repeating requirements.\n\n"
-            f"{filename_line}{language_line}{notes_line}"
-            "Code:\n"
-            f"```{language or ''}\n{code.strip()}\n```"
-        )
+        return [
+            {
+                "type": "text",
+                "text": REVIEW_INSTRUCTIONS,
+                "cache_control": {"type": "ephemeral"},
+            },
+            {
+                "type": "text",
+                "text": f"{filename_line}{language_line}{notes_line}Code:",
+            },
+            {
+                "type": "text",
+                "text": f"```{language}\n{code_stripped}\n```",
+            },
+        ]
 
     def _system_instructions(self) -> str:
         return (
@@ -0,0 +1,247 @@
+import asyncio
+import os
+import stat
+from types import SimpleNamespace
+
+import pytest
+
+import reviewer
+from reviewer import (
+    MAX_CONCURRENCY,
+    MAX_INPUT_TOKENS,
+    MIN_OUTPUT_TOKENS,
+    BatchPendingError,
+    CodeReviewService,
+    InputTooLargeError,
+    ReviewerBusyError,
+)
+
+check = CodeReviewService._check_reviewable
+
+
+def test_rejects_empty_code():
+    with pytest.raises(ValueError, match="No code provided for review in empty.py"):
+        check("  \n\t ", "empty.py")
+
+
+def test_rejects_short_code():
+    with pytest.raises(ValueError, match="Not enough code to review"):
+        check("x = 1")
+
+
+def test_rejects_python_file_of_only_comments():
+    code = "# TODO: write this module\n# and add some tests for it\n"
+    with pytest.raises(ValueError, match="Not enough code to review"):
+        check(code, "todo.py")
+
+
+def test_collapses_whitespace_when_counting():
+    with pytest.raises(ValueError, match="Not enough code to review"):
+        check("a = 1\n\n\n          \n\n\nb = 2\n")
+
+
+def test_accepts_short_function():
+    check("def f(x):\n    return x * 2 + 1\n")
+
+
+def test_rejects_pasted_comments_without_filename():
+    with pytest.raises(ValueError, match="Not enough code to review"):
+        check("# TODO: write this module\n#\n# and add some tests for it\n")
+
+
+def test_keeps_hash_code_lines_in_pasted_code():
+    check("#include <stdio.h>\n#define LIMIT 10\n")
+
+
+def test_keeps_hash_selectors_in_css():
+    check("#header { color: red; }\n#footer { color: blue; }\n", "style.css")
+
+
+def test_keeps_preprocessor_directives_in_c_headers():
+    check("#ifndef UTIL_H\n#define UTIL_H\n#include <stdio.h>\n#endif\n", "util.h")
+
+
+def test_accepts_regular_code():
+    check("def add(left, right):\n    return left + right\n", "math_utils.py")
+
+
+def test_rejects_code_above_token_budget():
+    code = "x = 1\n" * (MAX_INPUT_TOKENS)
+    with pytest.raises(InputTooLargeError):
+        check(code, "huge.py")
+
+
+def _service_with_cap(max_output_tokens):
+    service = CodeReviewService.__new__(CodeReviewService)
+    service.max_output_tokens = max_output_tokens
+    return service
+
+
+def test_small_files_get_the_output_floor():
+    assert _service_with_cap(2000)._max_tokens_for("x = 1\n") == MIN_OUTPUT_TOKENS
+
+
+def test_output_allowance_is_capped():
+    assert _service_with_cap(2000)._max_tokens_for("x = 1\n" * 5000) == 2000
+
+
+def test_low_override_lowers_the_floor():
+    assert _service_with_cap(300)._max_tokens_for("x = 1\n") == 300
+
+
+VALID_CODE = "def add(left, right):\n    return left + right\n"
+
+
+class FakeBatches:
+    def __init__(self, statuses, entries=()):
+        self.statuses = list(statuses)
+        self.entries = list(entries)
+        self.requests = None
+
+    def create(self, requests):
+        self.requests = requests
+        return SimpleNamespace(id="batch_1")
+
+    def retrieve(self, batch_id):
+        return SimpleNamespace(processing_status=self.statuses.pop(0))
+
+    def results(self, batch_id):
+        return iter(self.entries)
+
+
+def _batch_service(batches):
+    service = _service_with_cap(2000)
+    service.model = "test-model"
+    service.client = SimpleNamespace(messages=SimpleNamespace(batches=batches))
+    return service
+
+
+def _succeeded(custom_id, text):
+    message = SimpleNamespace(
+        content=[SimpleNamespace(text=text)],
+        usage=SimpleNamespace(input_tokens=10, output_tokens=5),
+        model="test-model",
+        stop_reason="end_turn",
+    )
+    return SimpleNamespace(custom_id=custom_id, result=SimpleNamespace(type="succeeded", message=message))
+
+
+def test_precheck_reports_rejected_files_in_place():
+    service = _service_with_cap(2000)
+    results, reviewable = service._precheck([("a.py", VALID_CODE), ("b.py", "x = 1"), ("c.py", VALID_CODE)])
+
+    assert reviewable == [0, 2]
+    assert [name for name, _, _ in results] == ["a.py", "b.py", "c.py"]
+    assert results[1][1].startswith("Review skipped: Not enough code")
+    assert all(metadata is None for _, _, metadata in results)
+
+
+def test_review_batch_raises_pending_with_batch_id():
+    batches = FakeBatches(statuses=["in_progress"])
+    service = _batch_service(batches)
+
+    with pytest.raises(BatchPendingError) as excinfo:
+        service.review_batch([("a.py", VALID_CODE), ("b.py", "")], max_wait=0)
+
+    assert excinfo.value.batch_id == "batch_1"
+    assert [request["custom_id"] for request in batches.requests] == ["review-0"]
+    assert excinfo.value.results[1][1].startswith("Review skipped: No code provided")
+
+
+def test_collect_batch_fills_results_by_position():
+    placeholders = [("utils.py", "pending", None), ("utils.py", "pending", None), ("skipped.py", "skipped", None)]
+    entries = [
+        SimpleNamespace(custom_id="review-1", result=SimpleNamespace(type="errored")),
+        _succeeded("review-0", "first review"),
+    ]
+    service = _batch_service(FakeBatches(statuses=["ended"], entries=entries))
+
+    results = service.collect_batch("batch_1", placeholders, max_wait=0)
+
+    assert results[0][:2] == ("utils.py", "first review")
+    assert results[0][2].output_tokens == 5
+    assert results[1] == ("utils.py", "Review errored.", None)
+    assert results[2] == ("skipped.py", "skipped", None)
+
+
+def test_private_dir_is_created_owner_only(tmp_path):
+    directory = reviewer._private_dir(str(tmp_path / "cache"))
+
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+
+
+def test_private_dir_tightens_existing_permissions(tmp_path):
+    directory = tmp_path / "cache"
+    directory.mkdir(mode=0o755)
+    os.chmod(directory, 0o755)
+
+    reviewer._private_dir(str(directory))
+
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+
+
+def test_private_dir_refuses_directory_of_another_user(tmp_path, monkeypatch):
+    monkeypatch.setattr(reviewer.os, "getuid", lambda: os.stat(tmp_path).st_uid + 1)
+
+    with pytest.raises(PermissionError):
+        reviewer._private_dir(str(tmp_path))
+
+
+def test_cache_key_changes_with_code_and_settings():
+    service = _batch_service(FakeBatches(statuses=[]))
+    request = service._request_kwargs(code=VALID_CODE, filename="a.py", language=None, notes=None)
+    same = service._request_kwargs(code=VALID_CODE, filename="a.py", language=None, notes=None)
+    other_code = service._request_kwargs(code=VALID_CODE + "# more\n", filename="a.py", language=None, notes=None)
+
+    assert service._cache_key(request) == service._cache_key(same)
+    assert service._cache_key(request) != service._cache_key(other_code)
+    assert service._cache_key(request) != service._cache_key({**request, "max_tokens": 1})
+
+
+def _hold_all_slots():
+    for _ in range(MAX_CONCURRENCY):
+        reviewer._SYNC_INFLIGHT.acquire()
+
+
+def _release_all_slots():
+    for _ in range(MAX_CONCURRENCY):
+        reviewer._SYNC_INFLIGHT.release()
+
+
+def test_sync_slot_raises_busy_after_timeout(monkeypatch):
+    monkeypatch.setattr(reviewer, "SLOT_WAIT_SECONDS", 0.01)
+    _hold_all_slots()
+    try:
+        with pytest.raises(ReviewerBusyError):
+            with reviewer._sync_inflight_slot():
+                pass
+    finally:
+        _release_all_slots()
+
+    assert reviewer._SYNC_INFLIGHT._value == MAX_CONCURRENCY
+
+
+def test_cancelled_async_slot_wait_returns_the_slot():
+    async def wait_for_slot():
+        async with reviewer._async_inflight_slot():
+            pass
+
+    async def scenario():
+        _hold_all_slots()
+        try:
+            task = asyncio.create_task(wait_for_slot())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        finally:
+            _release_all_slots()
+        # The worker thread now gets the slot and the done callback hands it back.
+        for _ in range(100):
+            if reviewer._SYNC_INFLIGHT._value == MAX_CONCURRENCY:
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+
+    assert reviewer._SYNC_INFLIGHT._value == MAX_CONCURRENCY